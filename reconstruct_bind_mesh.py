@@ -1,8 +1,18 @@
 import maya.cmds as cmds
 import maya.api.OpenMaya as om
 import maya.api.OpenMayaAnim as oma
+import numpy as np
 import time
 
+# Numba is optional: when available, the per-vertex kernel is JIT-compiled,
+# which avoids einsum planning and temporary allocation overhead on smaller
+# meshes.  The NumPy path below is the fallback.
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 def force_get_shape(node):
     if cmds.nodeType(node) == 'transform':
         return cmds.listRelatives(node, shapes=True)[0]
@@ -28,64 +38,157 @@ def get_skin_cluster_mobject(skin_cluster_name):
     sel_list.add(skin_cluster_name)
     return sel_list.getDependNode(0)
 
-def get_skin_weights(skin_cluster_name):
-    # Get the MObject for the skin cluster
-    selection_list = om.MGlobal.getSelectionListByName(skin_cluster_name)
-    skin_cluster_mobject = selection_list.getDependNode(0)
-    
-    # Initialize the skin cluster function set
-    skin_fn = oma.MFnSkinCluster(skin_cluster_mobject)
-    
-    # Get connected geometry (assuming there's just one connected geometry)
-    connected_geometries = cmds.listConnections(skin_cluster_name + '.outputGeometry[0]', s=False, d=True)
-    if not connected_geometries:
-        raise ValueError("No connected geometry found")
-    
-    first_connected_geometry = connected_geometries[0]
-    
-    # Get the dagPath for the geometry
-    selection_list = om.MGlobal.getSelectionListByName(first_connected_geometry)
-    dag_path = selection_list.getDagPath(0)
-    
-    # Getting the components (vertices in this case)
+def set_current_time(t):
+    # Set the scene time through the API, skipping cmds.currentTime's MEL dispatch
+    oma.MAnimControl.setCurrentTime(om.MTime(t, om.MTime.uiUnit()))
+
+def get_vertex_components():
+    # Build a component object covering mesh vertices (create once and reuse)
     components = om.MFnSingleIndexedComponent()
     components.create(om.MFn.kMeshVertComponent)
-    
-    # Get influence objects and weights
+    return components.object()
+
+def get_skin_weights(skin_fn, dag_path):
+    # Get influence objects and weights; a null component returns the full
+    # flat weight buffer in one call, with no component object to build.
+    # Callers wanting per-vertex rows should reshape the flat buffer to
+    # (num_vertices, num_influences) rather than slicing it
     influence_objects = skin_fn.influenceObjects()
-    weights, num_influences = skin_fn.getWeights(dag_path, components.object())
+    weights, num_influences = skin_fn.getWeights(dag_path, om.MObject())
     influence_indices = range(len(influence_objects))
 
     return weights, influence_indices
 
-def set_skin_weights(skin_cluster_name, weights, influence_indices):
-    # Get the MObject for the skin cluster
-    selection_list = om.MGlobal.getSelectionListByName(skin_cluster_name)
-    skin_cluster_mobject = selection_list.getDependNode(0)
+def set_skin_weights(skin_fn, dag_path, components, weights, influence_indices):
+    # Create an MDoubleArray for weights
+    weight_array = om.MDoubleArray(weights)
+
+    # Set the skin weights.  The copied weights are already normalized, so
+    # Maya's renormalization pass over every weight is skipped, and undo
+    # recording is suspended so the bulk set isn't journaled
+    cmds.undoInfo(stateWithoutFlush=False)
+    try:
+        skin_fn.setWeights(dag_path, components, om.MIntArray(influence_indices),
+                           weight_array, normalize=False)
+    finally:
+        cmds.undoInfo(stateWithoutFlush=True)
 
-    # Initialize the skin cluster function set
-    skin_fn = oma.MFnSkinCluster(skin_cluster_mobject)
 
-    # Get connected geometry (assuming there's just one connected geometry)
-    connected_geometries = cmds.listConnections(skin_cluster_name + '.outputGeometry[0]', s=False, d=True)
-    if not connected_geometries:
-        raise ValueError("No connected geometry found")
+def matrix_to_numpy(matrix):
+    """
+    Convert an MMatrix to a (4, 4) NumPy array in one flat-sequence pass.
+    The api 2.0 MMatrix doesn't export a buffer to view with np.frombuffer,
+    so a single bulk conversion is the cheapest bridge available; it only
+    runs once per joint per pose -- everything downstream stays in NumPy
+    until the final MPointArray transfer.
+    """
+    return np.array(matrix, dtype=np.float64).reshape(4, 4)
 
-    first_connected_geometry = connected_geometries[0]
 
-    # Get the dagPath for the geometry
-    selection_list = om.MGlobal.getSelectionListByName(first_connected_geometry)
-    dag_path = selection_list.getDagPath(0)
+def affine_inverse(matrices):
+    """
+    Invert an affine 4x4 matrix, or a stack of them, by inverting just the 3x3
+    block and rotating the negated translation.  Joint world matrices (and any
+    normalized blend of them) are always affine -- in Maya's row-vector
+    convention the last column is [0, 0, 0, 1] -- so the full generalized 4x4
+    inverse is wasted work.
+    """
+    rotation_inv = np.linalg.inv(matrices[..., :3, :3])
+    translation = matrices[..., 3, :3]
+    out = np.zeros(matrices.shape)
+    out[..., :3, :3] = rotation_inv
+    out[..., 3, :3] = -np.einsum('...j,...jk->...k', translation, rotation_inv)
+    out[..., 3, 3] = 1.0
+    return out
 
-    # Create a component object for vertices
-    components = om.MFnSingleIndexedComponent()
-    components.create(om.MFn.kMeshVertComponent)
 
-    # Create an MDoubleArray for weights
-    weight_array = om.MDoubleArray(weights)
+def build_skin_matrices(joint_bind, joint_deformed):
+    """
+    Build the skin matrix (inverse bind matrix * deformed matrix) for each joint
+    from (J, 4, 4) pose tensors, keyed by the same index order the skin weights
+    use.  Computing these once per joint avoids redundantly inverting the same
+    bind matrices for every vertex, and the contiguous stacks let the inverse
+    and product run as single batched calls.
+    """
+    return affine_inverse(joint_bind) @ joint_deformed
+
+
+def compact_weights(W):
+    """
+    Compact a dense (V, J) weight array to (V, k) weights plus (V, k) influence
+    indices, where k is the widest nonzero row -- LBS weights rarely have more
+    than a few nonzero entries per vertex, so for rigs with many joints this
+    drops most of the zero multiplies from the blend without losing anything.
+    """
+    k = max(int(np.count_nonzero(W, axis=1).max()), 1)
+    indices = np.argsort(-W, axis=1)[:, :k]
+    return np.take_along_axis(W, indices, axis=1), indices
+
+
+def skin_bind_points_numpy(W, influence_indices, skin_matrices, P):
+    """
+    Transform deformed points back into bind space with batched NumPy calls.
+    W is (V, k) compacted weights with (V, k) influence_indices into the
+    (J, 4, 4) skin_matrices, and P is (V, 3) deformed positions; returns
+    (V, 3) bind positions.
+    """
+    # Gather each vertex's influence matrices and blend them in one batched
+    # product, then invert the whole stack at once.  Every gathered influence
+    # contributes unconditionally -- the branchless sum is what lets NumPy
+    # vectorize across the influence axis
+    weighted_skin_matrices = np.einsum('vk,vkab->vab', W, skin_matrices[influence_indices],
+                                       optimize=True)
 
-    # Set the skin weights
-    skin_fn.setWeights(dag_path, components.object(), om.MIntArray(influence_indices), weight_array)
+    # Maya matrices are row-vector (points multiply on the left), so in affine
+    # terms the bind position x satisfies x @ R = p - t.  Solve that directly
+    # over the (V, 3, 3) rotation blocks in one batched LAPACK call -- one
+    # factorization plus back-substitution per matrix, with no explicit
+    # inverse ever materialized
+    rotation = weighted_skin_matrices[:, :3, :3]
+    translation = weighted_skin_matrices[:, 3, :3]
+    return np.linalg.solve(rotation.transpose(0, 2, 1), (P - translation)[..., None])[..., 0]
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _skin_bind_points_numba(W, influence_indices, skin_matrices, P, out):
+        # Same math as skin_bind_points_numpy, but fused into one compiled
+        # pass with no temporary matrix stacks.  Vertices are independent, so
+        # prange splits them across cores with the GIL released
+        num_vertices = W.shape[0]
+        num_influences = W.shape[1]
+        for v in prange(num_vertices):
+            # Accumulate element-wise so the blend allocates nothing beyond
+            # the one accumulator per iteration
+            weighted = np.zeros((4, 4))
+            for j in range(num_influences):
+                w = W[v, j]
+                m = skin_matrices[influence_indices[v, j]]
+                for a in range(4):
+                    for b in range(4):
+                        weighted[a, b] += w * m[a, b]
+            rotation_inv = np.linalg.inv(weighted[:3, :3])
+            x = P[v, 0] - weighted[3, 0]
+            y = P[v, 1] - weighted[3, 1]
+            z = P[v, 2] - weighted[3, 2]
+            for c in range(3):
+                out[v, c] = (x * rotation_inv[0, c] +
+                             y * rotation_inv[1, c] +
+                             z * rotation_inv[2, c])
+
+
+def skin_bind_points(W, skin_matrices, P):
+    """
+    Compact the dense (V, J) weights to their nonzero influences, then dispatch
+    the bind-space transform to the Numba kernel when available, otherwise the
+    batched NumPy path.
+    """
+    W_compact, influence_indices = compact_weights(W)
+    if HAS_NUMBA:
+        out = np.empty((W.shape[0], 3))
+        _skin_bind_points_numba(W_compact, influence_indices, skin_matrices, P, out)
+        return out
+    return skin_bind_points_numpy(W_compact, influence_indices, skin_matrices, P)
 
 
 def reconstruct_bind_mesh(input_mesh, output_mesh, bind_pose_time, deformed_time):
@@ -105,96 +208,116 @@ def reconstruct_bind_mesh(input_mesh, output_mesh, bind_pose_time, deformed_time
     """
     start_time = time.time()
 
-    input_mesh = force_get_shape(input_mesh)
-    input_mesh_dag_path = get_dag_path(input_mesh)
+    # Suspend viewport refresh and pause VP2 while we jump around the
+    # timeline; every time change would otherwise trigger a redraw on top of
+    # the DG evaluation we actually need
+    cmds.refresh(suspend=True)
+    viewport_was_paused = cmds.ogs(query=True, pause=True)
+    if not viewport_was_paused:
+        cmds.ogs(pause=True)
+    try:
+        input_mesh = force_get_shape(input_mesh)
+        input_mesh_dag_path = get_dag_path(input_mesh)
     
     
-    # Create an MFnMesh object for the input mesh
-    input_mesh_fn = get_mfn_mesh(input_mesh)
-    # Get the number of vertices in the input mesh
-    num_vertices = input_mesh_fn.numVertices
-    # Delete the output mesh if it already exists
-    if cmds.objExists(output_mesh):
-        cmds.delete(output_mesh)
+        # Create an MFnMesh object for the input mesh
+        input_mesh_fn = get_mfn_mesh(input_mesh)
+        # Get the number of vertices in the input mesh
+        num_vertices = input_mesh_fn.numVertices
+        # Delete the output mesh if it already exists
+        if cmds.objExists(output_mesh):
+            cmds.delete(output_mesh)
     
     
-    # Duplicate the input mesh
-    duplicate_mesh = cmds.duplicate(input_mesh)[0]
-    duplicate_mesh = cmds.rename(duplicate_mesh, output_mesh)
-    duplicate_mesh_fn = get_mfn_mesh(duplicate_mesh)
-    # List all the connections to the vertex attribute
-    connections = cmds.listConnections(input_mesh, source=True, destination=False, plugs=True)
-    # Find the skinCluster node among the connections
-    skin_cluster_name = None
-    for connection in connections:
-        if cmds.nodeType(connection) == 'skinCluster':
-            skin_cluster_name = connection.split('.')[0]
-            break
+        # Duplicate the input mesh
+        duplicate_mesh = cmds.duplicate(input_mesh)[0]
+        duplicate_mesh = cmds.rename(duplicate_mesh, output_mesh)
+        duplicate_mesh_fn = get_mfn_mesh(duplicate_mesh)
+        # List all the connections to the vertex attribute
+        connections = cmds.listConnections(input_mesh, source=True, destination=False, plugs=True)
+        # Find the skinCluster node among the connections
+        skin_cluster_name = None
+        for connection in connections:
+            if cmds.nodeType(connection) == 'skinCluster':
+                skin_cluster_name = connection.split('.')[0]
+                break
     
     
-    if skin_cluster_name:
-        # Get the list of joints influencing the skin cluster
-        joints = cmds.skinCluster(skin_cluster_name, query=True, inf=True)
+        if skin_cluster_name:
+            # Get the list of joints influencing the skin cluster
+            joints = cmds.skinCluster(skin_cluster_name, query=True, inf=True)
         
-        # Cache the bind pose
-        # NOTE: we can't use the bind pose defined in the skin cluster because this mesh has the incorrect bind pose
-        # so, we use bind_pose_time to get the real bind pose
-        cmds.currentTime(bind_pose_time)
-        cached_bind_pose = {}
-        for joint in joints:
-            m = om.MMatrix(cmds.xform(joint, q=True, matrix=True, worldSpace=True))
-            cached_bind_pose[joint] = m
-
-        # Now, make sure we're at the reference/accurate/deformed time, and cache the pose
-        cmds.currentTime(deformed_time)
-        cached_deformed_pose = {}
-        for joint in joints:
-            m = om.MMatrix(cmds.xform(joint, q=True, matrix=True, worldSpace=True))
-            cached_deformed_pose[joint] = m      
-
-        # get all source points
-        source_points = input_mesh_fn.getPoints(space=om.MSpace.kWorld)
-
-        # get all source weights
-        skin_cluster = oma.MFnSkinCluster(get_mobject(skin_cluster_name))
-               
-        influence_objects = skin_cluster.influenceObjects()
-        weights, num_influences = skin_cluster.getWeights(input_mesh_dag_path, om.MObject())
-        weights = list(weights)
-        
-        bind_verts = []
-        vertex_index = 0
-        print("Reconstructing {} vertices".format(num_vertices))
-        for i in range(0, len(weights), num_influences):
-            cur_vertex = source_points[vertex_index]
-            vertex_weights = weights[i:i + num_influences]
-            weighted_skin_matrix = om.MMatrix([0.0] * 16)
-            for j, weight in enumerate(vertex_weights):
-                if weight > 0.0:
-                    joint_name = joints[j]
-                    current_joint_matrix = cached_deformed_pose[joint_name]                   
-                    bind_joint_matrix = cached_bind_pose[joint_name]
-                    skin_matrix = bind_joint_matrix.inverse() * current_joint_matrix
-                    weighted_skin_matrix += weight * skin_matrix
-            bind_vertex = cur_vertex * weighted_skin_matrix.inverse()
-            bind_verts.append(bind_vertex)
-            vertex_index += 1
-            
-        duplicate_mesh_fn.setPoints(bind_verts, space=om.MSpace.kWorld)
+            # Cache a dag path per joint once, so each pose query below is a direct
+            # API matrix read instead of a cmds.xform round-trip
+            joint_dag_paths = [get_dag_path(joint) for joint in joints]
+
+            # Cache the bind pose as one contiguous (J, 4, 4) tensor
+            # NOTE: we can't use the bind pose defined in the skin cluster because this mesh has the incorrect bind pose
+            # so, we use bind_pose_time to get the real bind pose
+            set_current_time(bind_pose_time)
+            joint_bind = np.array([matrix_to_numpy(dag_path.inclusiveMatrix())
+                                   for dag_path in joint_dag_paths])
+
+            # Now, make sure we're at the reference/accurate/deformed time, and cache the pose
+            set_current_time(deformed_time)
+            joint_deformed = np.array([matrix_to_numpy(dag_path.inclusiveMatrix())
+                                       for dag_path in joint_dag_paths])
+
+            # get all source points
+            source_points = input_mesh_fn.getPoints(space=om.MSpace.kWorld)
+
+            # get all source weights
+            skin_fn = oma.MFnSkinCluster(get_mobject(skin_cluster_name))
+            weights, num_influences = skin_fn.getWeights(input_mesh_dag_path, om.MObject())
+
+            print("Reconstructing {} vertices".format(num_vertices))
+
+            # One row of joint weights per vertex, converted from the MDoubleArray
+            # in a single pass with no intermediate Python list
+            W = np.array(weights, dtype=np.float64).reshape(num_vertices, num_influences)
+
+            # Precompute each joint's skin matrix once, in the same index order
+            # the weights use
+            skin_matrices = build_skin_matrices(joint_bind, joint_deformed)
+
+            # Transform every deformed point back into bind space
+            P = np.array([[p.x, p.y, p.z] for p in source_points])
+            bind_xyz = skin_bind_points(W, skin_matrices, P)
+            bind_points = np.concatenate([bind_xyz, np.ones((num_vertices, 1))], axis=1)
+
+            # Hand the whole (V, 4) result to MPointArray in one bulk construction
+            # instead of building a Python MPoint object per vertex
+            duplicate_mesh_fn.setPoints(om.MPointArray(bind_points.tolist()), space=om.MSpace.kWorld)
         
-        # Now, we want to bind the new mesh to the original bind pose, and copy weights by index
-        cmds.currentTime(bind_pose_time)
-        cmds.select(clear=True)
-        weights, influence_indices = get_skin_weights(skin_cluster_name)
-        target_skin_cluster_name = cmds.skinCluster(joints, duplicate_mesh, toSelectedBones=True, bindMethod=0, skinMethod=0)[0]
-        set_skin_weights(target_skin_cluster_name, weights, influence_indices)
+            # Now, we want to bind the new mesh to the original bind pose, and copy weights by index
+            # (the skin cluster function sets and dag paths are resolved once here
+            # rather than re-resolved inside each helper)
+            set_current_time(bind_pose_time)
+            cmds.select(clear=True)
+            weights, influence_indices = get_skin_weights(skin_fn, input_mesh_dag_path)
+            vertex_components = get_vertex_components()
+            # Bind with normalization off so Maya doesn't run a weight solve we
+            # are about to overwrite, pour the copied weights straight in, then
+            # re-enable interactive normalization -- one solver pass instead of
+            # bind + set + renormalize
+            target_skin_cluster_name = cmds.skinCluster(joints, duplicate_mesh, toSelectedBones=True,
+                                                        bindMethod=0, skinMethod=0, normalizeWeights=0)[0]
+            target_skin_fn = oma.MFnSkinCluster(get_mobject(target_skin_cluster_name))
+            target_mesh_dag_path = get_dag_path(force_get_shape(duplicate_mesh))
+            set_skin_weights(target_skin_fn, target_mesh_dag_path, vertex_components, weights, influence_indices)
+            cmds.setAttr(target_skin_cluster_name + '.normalizeWeights', 1)
      
-    else:
-        print("No skinCluster found for the mesh.")
+        else:
+            print("No skinCluster found for the mesh.")
         
+    finally:
+        cmds.refresh(suspend=False)
+        if not viewport_was_paused:
+            # ogs pause is a toggle, so flip it back
+            cmds.ogs(pause=True)
+
     end_time = time.time()
     elapsed_time = end_time - start_time
-    # currently, this is running about 15.7s
     print("reconstruct_bind_mesh() finished.  Elapsed time: {:.2f} seconds.".format(elapsed_time))
     
 